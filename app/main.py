@@ -1,9 +1,23 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import hashlib
+import os
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from app.processing import load_graph_data, detect_communities, generate_graph_image
+from app.processing import (
+    load_graph_data,
+    detect_communities,
+    generate_graph_image,
+    compute_partition,
+    compute_layout,
+    partition_labels,
+    modularity_fast,
+)
+import community.community_louvain as community_louvain
 import logging
 
 # Configure logging
@@ -13,6 +27,9 @@ logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
     DATA_PATH: str = "data/Databike.csv"
+    MAX_ROWS: int = 1000  # 0 or negative loads the full file
+    LOUVAIN_BACKEND: str = "networkit"
+    LOUVAIN_THRESHOLD: float = 1e-4
 
 
 settings = Settings()
@@ -22,22 +39,89 @@ settings = Settings()
 graph_state = {}
 
 
+def _render_png(G, partition, pos, labels=None, num_communities=None) -> bytes:
+    """Picklable wrapper so the PNG render can run in a pool worker."""
+    return generate_graph_image(G, partition=partition, pos=pos,
+                                labels=labels,
+                                num_communities=num_communities).getvalue()
+
+
+async def _run_cpu(func, *args, **kwargs):
+    """
+    Runs a CPU-bound callable off the event loop.
+
+    Uses the process pool when the lifespan created one (scales with
+    cores, no GIL contention); falls back to the default thread pool when
+    the app runs without its lifespan, as the test client does.
+    """
+    pool = getattr(app.state, "pool", None)
+    return await asyncio.get_running_loop().run_in_executor(
+        pool, partial(func, *args, **kwargs))
+
+
+async def _get_partition():
+    """
+    Returns the cached partition, computing and memoizing it on a miss.
+
+    Keeps /analyze and /visualize from each running their own Louvain
+    pass when the startup cache is absent (e.g. graph injected after
+    boot).
+    """
+    partition = graph_state.get("partition")
+    if partition is None and graph_state.get("G") is not None:
+        partition = await _run_cpu(compute_partition, graph_state["G"],
+                                   backend=settings.LOUVAIN_BACKEND,
+                                   threshold=settings.LOUVAIN_THRESHOLD)
+        graph_state["partition"] = partition
+    return partition
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Workers receive their inputs per call, so a plain pool suffices
+    app.state.pool = ProcessPoolExecutor(max_workers=os.cpu_count())
     # Load the graph data on startup
     logger.info("Loading graph data...")
     try:
-        graph_state["G"] = load_graph_data(settings.DATA_PATH)
-        logger.info(f"Graph loaded successfully with {len(graph_state['G'].nodes)} nodes.")
+        G = load_graph_data(settings.DATA_PATH, nrows=settings.MAX_ROWS)
+        graph_state["G"] = G
+        logger.info(f"Graph loaded successfully with {len(G.nodes)} nodes.")
+        # Run Louvain once up front so /analyze and /visualize only do
+        # dict lookups instead of recomputing the partition per request.
+        partition = compute_partition(G, backend=settings.LOUVAIN_BACKEND,
+                                      threshold=settings.LOUVAIN_THRESHOLD)
+        graph_state["partition"] = partition
+        if G.graph.get("adj") is not None:
+            graph_state["modularity"] = modularity_fast(
+                partition, G.graph["adj"], G.graph["node_ids"])
+        else:
+            graph_state["modularity"] = community_louvain.modularity(partition, G)
+        labels, num_communities = partition_labels(partition, G)
+        graph_state["labels"] = labels
+        graph_state["num_communities"] = num_communities
+        logger.info("Community partition cached.")
+        # The layout is as expensive as Louvain and equally static, so
+        # compute it once here and keep /visualize to pure rendering.
+        graph_state["pos"] = compute_layout(G)
+        logger.info("Graph layout cached.")
+        # Render the PNG once so /visualize is a plain bytes send
+        png = _render_png(G, partition, graph_state["pos"],
+                          labels=labels, num_communities=num_communities)
+        graph_state["png"] = png
+        graph_state["etag"] = f'"{hashlib.sha1(png).hexdigest()}"'
+        logger.info("Visualization PNG cached.")
     except Exception as e:
         logger.error(f"Failed to load graph data: {e}")
         graph_state["G"] = None
     yield
     # Clean up resources on shutdown
+    app.state.pool.shutdown()
+    app.state.pool = None
     graph_state.clear()
     logger.info("Graph data cleared.")
 
-app = FastAPI(title="Mobility Network Community Detection", lifespan=lifespan)
+app = FastAPI(title="Mobility Network Community Detection", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 
 class AnalysisResult(BaseModel):
@@ -58,12 +142,33 @@ def home():
 
 
 @app.get("/analyze", response_model=AnalysisResponse)
-def analyze_network():
+async def analyze_network():
     if graph_state.get("G") is None:
         raise HTTPException(status_code=503, detail="Graph data not available")
 
     try:
-        results = detect_communities(graph_state["G"])
+        partition = graph_state.get("partition")
+        modularity = graph_state.get("modularity")
+        num_communities = graph_state.get("num_communities")
+        if partition is not None and modularity is not None and num_communities is not None:
+            # Fully cached: just dict lookups, not worth pickling the
+            # graph and partition through the pool
+            results = detect_communities(
+                graph_state["G"],
+                partition=partition,
+                modularity=modularity,
+                num_communities=num_communities,
+            )
+        else:
+            results = await _run_cpu(
+                detect_communities,
+                graph_state["G"],
+                partition=await _get_partition(),
+                modularity=modularity,
+                num_communities=num_communities,
+                backend=settings.LOUVAIN_BACKEND,
+                threshold=settings.LOUVAIN_THRESHOLD,
+            )
         return {
             "status": "success",
             "algorithm": "Louvain",
@@ -75,14 +180,38 @@ def analyze_network():
 
 
 @app.get("/visualize")
-def visualize_network():
-    """Generate and return a visualization of the network with community colors."""
+async def visualize_network(request: Request):
+    """Return a visualization of the network with community colors."""
     if graph_state.get("G") is None:
         raise HTTPException(status_code=503, detail="Graph data not available")
 
     try:
-        img_buf = generate_graph_image(graph_state["G"])
-        return StreamingResponse(img_buf, media_type="image/png")
+        png = graph_state.get("png")
+        if png is None:
+            # No startup cache (e.g. graph injected after boot): render
+            # once on demand and memoize for subsequent requests
+            png = await _run_cpu(
+                _render_png,
+                graph_state["G"],
+                await _get_partition(),
+                graph_state.get("pos"),
+                labels=graph_state.get("labels"),
+                num_communities=graph_state.get("num_communities"),
+            )
+            graph_state["png"] = png
+            graph_state["etag"] = f'"{hashlib.sha1(png).hexdigest()}"'
+
+        etag = graph_state["etag"]
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            # RFC 7232: a comma-separated list of (possibly weak) quoted
+            # entity-tags, or "*" to match any representation
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+            if etag in tags or "*" in tags:
+                return Response(status_code=304, headers=headers)
+        return Response(content=png, media_type="image/png", headers=headers)
     except Exception as e:
         logger.error(f"Error generating visualization: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,36 +1,179 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import community.community_louvain as community_louvain
-import matplotlib.pyplot as plt
-import io
-from io import BytesIO
-from typing import Dict, Any
+import matplotlib
+matplotlib.use('Agg')  # headless backend; never pull in a GUI toolkit
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.collections import LineCollection  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+import io  # noqa: E402
+import queue  # noqa: E402
+from io import BytesIO  # noqa: E402
+from typing import Dict, Any, Optional  # noqa: E402
 
+# Collapse sub-pixel edge segments during Agg rendering
+plt.rcParams['path.simplify_threshold'] = 1.0
 
-def load_graph_data(filepath: str) -> nx.Graph:
+try:
+    import networkit as nk
+    NETWORKIT_AVAILABLE = True
+except ImportError:
+    NETWORKIT_AVAILABLE = False
+
+try:
+    import cudf
+    import cugraph
+    CUGRAPH_AVAILABLE = True
+except ImportError:
+    CUGRAPH_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import graphblas as gb
+    GRAPHBLAS_AVAILABLE = True
+except ImportError:
+    GRAPHBLAS_AVAILABLE = False
+
+try:
+    from fa2_modified import ForceAtlas2
+    FA2_AVAILABLE = True
+except ImportError:
+    FA2_AVAILABLE = False
+
+try:
+    import datashader as ds
+    import datashader.transfer_functions as tf
+    from datashader.bundling import connect_edges
+    from PIL import Image
+    DATASHADER_AVAILABLE = True
+except ImportError:
+    DATASHADER_AVAILABLE = False
+
+# Below this size the CPU backends win; GPU transfer overhead dominates.
+GPU_NODE_THRESHOLD = 10000
+
+# Below this size matplotlib renders quickly and looks better (labels,
+# legend); above it per-artist drawing dominates and we rasterize instead.
+DATASHADER_NODE_THRESHOLD = 500
+
+# Rendered figures are returned here and reused, amortizing Agg canvas
+# and buffer allocations across requests (one pool per worker process)
+_FIG_POOL: queue.Queue = queue.Queue(maxsize=4)
+
+
+def _acquire_figure() -> Figure:
+    """Takes a pooled Figure, building a fresh one when the pool is empty."""
+    try:
+        fig = _FIG_POOL.get_nowait()
+        fig.clear()
+    except queue.Empty:
+        fig = Figure(figsize=(12, 9))
+    return fig
+
+
+def _release_figure(fig: Figure) -> None:
+    """Returns a Figure to the pool, dropping it if the pool is full."""
+    try:
+        _FIG_POOL.put_nowait(fig)
+    except queue.Full:
+        pass
+
+
+def _community_centroids(pos: np.ndarray, labels: np.ndarray,
+                         num_communities: int) -> np.ndarray:
+    """
+    Computes the mean position of each community in one segmented-sum pass.
+
+    Args:
+        pos: (N, 2) array of node positions.
+        labels: (N,) array of dense community labels in [0, num_communities).
+        num_communities: Number of distinct communities.
+
+    Returns:
+        A (num_communities, 2) array of community centroids.
+    """
+    sums = np.zeros((num_communities, 2))
+    counts = np.zeros(num_communities, dtype=np.int64)
+    for i in range(pos.shape[0]):
+        c = labels[i]
+        sums[c, 0] += pos[i, 0]
+        sums[c, 1] += pos[i, 1]
+        counts[c] += 1
+    return sums / counts.reshape(-1, 1)
+
+
+if NUMBA_AVAILABLE:
+    _community_centroids = njit(cache=True, fastmath=True)(_community_centroids)
+
+
+def load_graph_data(filepath: str, nrows: Optional[int] = 1000) -> nx.Graph:
     """
     Loads graph data from a CSV file.
 
     Args:
         filepath: Path to the CSV file.
+        nrows: Maximum number of trips to load; None, zero, or a negative
+            value loads the full file.
 
     Returns:
-        A NetworkX graph object.
+        A NetworkX graph object. The graph carries two structure-of-arrays
+        companions in G.graph for array-based consumers: "adj", a binary
+        symmetric CSR adjacency matrix, and "node_ids", the station ID for
+        each CSR row index.
 
     Raises:
         FileNotFoundError: If the file does not exist.
         ValueError: If required columns are missing.
     """
     try:
-        # Load a subset of data to ensure speed
+        # Parse only the two station-ID columns, as int32, using the
+        # multithreaded Arrow CSV reader when pyarrow is installed.
         # Using departure_id and return_id as per Databike.csv structure
-        df = pd.read_csv(filepath, nrows=1000)
-
         required_columns = ['departure_id', 'return_id']
-        if not all(col in df.columns for col in required_columns):
-            raise ValueError(f"CSV must contain columns: {required_columns}")
+        read_kwargs = {
+            "usecols": required_columns,
+            "dtype": {'departure_id': 'int32', 'return_id': 'int32'},
+        }
+        row_limit = nrows if nrows is not None and nrows > 0 else None
+        try:
+            df = pd.read_csv(filepath, engine="pyarrow", **read_kwargs)
+            # The Arrow engine has no nrows option, so truncate post-parse
+            if row_limit is not None:
+                df = df.head(row_limit)
+        except (ImportError, ValueError):
+            # pyarrow missing or rejected the file; retry with the C
+            # parser, which can stop at the row limit during the parse
+            df = pd.read_csv(filepath, nrows=row_limit, **read_kwargs)
+
+        # Factorize station IDs to contiguous int32 indices and build the
+        # CSR adjacency directly from the columns; the fast Louvain and
+        # modularity backends iterate this instead of Python dicts
+        codes, node_ids = pd.factorize(
+            pd.concat([df['departure_id'], df['return_id']], ignore_index=True))
+        num_trips = len(df)
+        src = codes[:num_trips].astype(np.int32)
+        dst = codes[num_trips:].astype(np.int32)
+        num_nodes = len(node_ids)
+        adj = sp.coo_matrix(
+            (np.ones(num_trips, dtype=np.int32), (src, dst)),
+            shape=(num_nodes, num_nodes)).tocsr()
+        adj.data[:] = 1  # collapse repeated trips into simple edges
+        adj = adj.maximum(adj.T)  # undirected
 
         G = nx.from_pandas_edgelist(df, source='departure_id', target='return_id')
+        # Materialize unit weights so python-louvain's inner loop reads
+        # the attribute directly instead of calling .get('weight', 1)
+        # per edge per pass
+        nx.set_edge_attributes(G, 1.0, 'weight')
+        G.graph["adj"] = adj
+        G.graph["node_ids"] = np.asarray(node_ids)
         return G
     except FileNotFoundError:
         raise
@@ -38,12 +181,181 @@ def load_graph_data(filepath: str) -> nx.Graph:
         raise ValueError(f"Error loading graph data: {str(e)}")
 
 
-def detect_communities(G: nx.Graph) -> Dict[str, Any]:
+def _compute_partition_gpu(G: nx.Graph) -> Dict[Any, int]:
+    """
+    Computes a Louvain partition on the GPU via cuGraph.
+
+    Args:
+        G: A NetworkX graph object.
+
+    Returns:
+        A dictionary mapping each node to its community ID.
+    """
+    edges = nx.to_pandas_edgelist(G)
+    gdf = cudf.DataFrame({"src": edges["source"], "dst": edges["target"]})
+    cuG = cugraph.Graph()
+    cuG.from_cudf_edgelist(gdf, source="src", destination="dst")
+    parts, _ = cugraph.louvain(cuG)
+    return dict(zip(parts["vertex"].to_pandas(), parts["partition"].to_pandas()))
+
+
+def compute_partition(G: nx.Graph, backend: str = "networkit",
+                      threshold: float = 1e-4) -> Dict[Any, int]:
+    """
+    Computes a Louvain partition of the graph.
+
+    Large graphs are handed to cuGraph when a CUDA stack is installed;
+    otherwise NetworKit's parallel Louvain (PLM) runs the local-move loop
+    in compiled C++ instead of Python, only revisiting nodes whose
+    neighborhood changed. Without NetworKit, NetworkX's Louvain is used
+    with modularity-gain early stopping. backend="python-louvain" forces
+    the original implementation (kept for parity checks).
+
+    Args:
+        G: A NetworkX graph object.
+        backend: "networkit" (default) or "python-louvain".
+        threshold: Modularity gain below which the CPU fallback stops
+            iterating; ignored by the NetworKit and GPU paths.
+
+    Returns:
+        A dictionary mapping each node to its community ID.
+    """
+    if backend == "python-louvain":
+        # Fixed random_state gives a deterministic node order, so repeated
+        # runs produce the same partition and stay cache-friendly
+        return community_louvain.best_partition(G, random_state=0)
+    if CUGRAPH_AVAILABLE and len(G.nodes) > GPU_NODE_THRESHOLD:
+        return _compute_partition_gpu(G)
+    if NETWORKIT_AVAILABLE and len(G.nodes) > 0:
+        nkG = nk.nxadapter.nx2nk(G)
+        plm = nk.community.PLM(nkG, refine=True, par="balanced")
+        plm.run()
+        part = plm.getPartition()
+        # nx2nk numbers nodes by iteration order, so map IDs back the same way
+        return {node: part[i] for i, node in enumerate(G.nodes())}
+    communities = nx.community.louvain_communities(G, threshold=threshold,
+                                                   seed=0)
+    return {node: comm_id
+            for comm_id, community in enumerate(communities)
+            for node in community}
+
+
+def compute_layout(G: nx.Graph) -> Dict[Any, Any]:
+    """
+    Computes 2D node positions for visualization.
+
+    Uses ForceAtlas2 with Barnes-Hut approximation (O(N log N) repulsion,
+    Cython inner loop) when fa2_modified is installed, working on the CSR
+    adjacency rather than the NetworkX dicts. Falls back to NetworkX's
+    pure-Python spring layout otherwise.
+
+    Args:
+        G: A NetworkX graph object.
+
+    Returns:
+        A dictionary mapping each node to an (x, y) position.
+    """
+    if FA2_AVAILABLE and len(G.nodes) > 0:
+        csr = nx.to_scipy_sparse_array(G, format='csr')
+        fa2 = ForceAtlas2(barnesHutOptimize=True, barnesHutTheta=1.2,
+                          scalingRatio=2.0, verbose=False)
+        coords = fa2.forceatlas2(csr, pos=None, iterations=100)
+        return {node: coords[i] for i, node in enumerate(G.nodes())}
+    return nx.spring_layout(G, k=0.5, iterations=50, seed=42)
+
+
+def modularity_fast(partition: Dict[Any, int], adj: sp.spmatrix,
+                    node_ids: np.ndarray) -> float:
+    """
+    Computes modularity from the CSR adjacency via sparse matrix algebra.
+
+    The intra-community edge weights reduce to the diagonal of the triple
+    product C'AC, where C is the n x k one-hot cluster matrix, evaluated
+    in SuiteSparse:GraphBLAS when python-graphblas is installed and in
+    scipy otherwise. Matches community_louvain.modularity on the
+    equivalent NetworkX graph, including self-loop handling.
+
+    Args:
+        partition: Node -> community mapping.
+        adj: Binary symmetric CSR adjacency as built by load_graph_data.
+        node_ids: Station ID for each CSR row index.
+
+    Returns:
+        The modularity of the partition.
+    """
+    num_nodes = adj.shape[0]
+    if num_nodes == 0:
+        return 0.0
+
+    comm_ids, labels = np.unique(
+        np.fromiter((partition[node] for node in node_ids),
+                    dtype=np.int64, count=num_nodes),
+        return_inverse=True)
+    num_communities = len(comm_ids)
+
+    C = sp.csr_matrix(
+        (np.ones(num_nodes), (np.arange(num_nodes), labels)),
+        shape=(num_nodes, num_communities))
+    if GRAPHBLAS_AVAILABLE:
+        A_gb = gb.io.from_scipy_sparse(adj.astype(np.float64))
+        C_gb = gb.io.from_scipy_sparse(C)
+        trace_c = C_gb.T.mxm(A_gb.mxm(C_gb).new()).new().diag().to_dense(0.0)
+    else:
+        trace_c = np.asarray((C.T @ adj @ C).diagonal(), dtype=np.float64)
+
+    # Self-loops sit once on the diagonal but count twice towards degree,
+    # mirroring how NetworkX and python-louvain treat them
+    diag = adj.diagonal().astype(np.float64)
+    diag_c = np.bincount(labels, weights=diag, minlength=num_communities)
+    intra_c = (trace_c + diag_c) / 2.0
+    deg = np.asarray(adj.sum(axis=1)).ravel() + diag
+    deg_c = np.bincount(labels, weights=deg, minlength=num_communities)
+    num_links = (adj.sum() + diag.sum()) / 2.0
+
+    return float(np.sum(intra_c / num_links - (deg_c / (2.0 * num_links)) ** 2))
+
+
+def partition_labels(partition: Dict[Any, int], G: nx.Graph) -> tuple:
+    """
+    Converts a partition dict to a dense int32 label array.
+
+    The labels are built explicitly in G.nodes() order — the order the
+    rendering code indexes against — since backends differ in how they
+    populate the partition dict (e.g. community-by-community for the
+    NetworkX fallback).
+
+    Args:
+        partition: Node -> community mapping.
+        G: The graph whose node iteration order the labels must follow.
+
+    Returns:
+        A (labels, num_communities) pair where labels[i] is the dense
+        0..K-1 community of the i-th node of G.nodes().
+    """
+    comm_ids, labels = np.unique(
+        np.fromiter((partition[node] for node in G.nodes()),
+                    dtype=np.int64, count=G.number_of_nodes()),
+        return_inverse=True)
+    return labels.astype(np.int32), len(comm_ids)
+
+
+def detect_communities(G: nx.Graph,
+                       partition: Optional[Dict[Any, int]] = None,
+                       modularity: Optional[float] = None,
+                       num_communities: Optional[int] = None,
+                       backend: str = "networkit",
+                       threshold: float = 1e-4) -> Dict[str, Any]:
     """
     Detects communities in the graph using the Louvain algorithm.
 
     Args:
         G: A NetworkX graph object.
+        partition: Optional precomputed node -> community mapping. When
+            provided, the Louvain pass is skipped.
+        modularity: Optional precomputed modularity for the partition.
+        num_communities: Optional precomputed community count.
+        backend: Forwarded to compute_partition on a cache miss.
+        threshold: Forwarded to compute_partition on a cache miss.
 
     Returns:
         A dictionary containing modularity score, number of communities, and total nodes.
@@ -56,13 +368,17 @@ def detect_communities(G: nx.Graph) -> Dict[str, Any]:
         }
 
     # This is the Louvain algorithm (Fast optimization)
-    partition = community_louvain.best_partition(G)
+    if partition is None:
+        partition = compute_partition(G, backend=backend, threshold=threshold)
+        modularity = None
 
     # Calculate modularity (A metric for quality)
-    modularity = community_louvain.modularity(partition, G)
+    if modularity is None:
+        modularity = community_louvain.modularity(partition, G)
 
     # Count communities
-    num_communities = len(set(partition.values()))
+    if num_communities is None:
+        num_communities = len(set(partition.values()))
 
     return {
         "modularity_score": modularity,
@@ -71,74 +387,161 @@ def detect_communities(G: nx.Graph) -> Dict[str, Any]:
     }
 
 
-def generate_graph_image(G: nx.Graph) -> BytesIO:
+def _generate_graph_image_datashader(G: nx.Graph,
+                                     partition: Dict[Any, int],
+                                     pos: Dict[Any, Any]) -> BytesIO:
+    """
+    Rasterizes the graph with Datashader instead of matplotlib.
+
+    Per-pixel aggregation keeps the cost proportional to the canvas size
+    rather than the number of nodes and edges.
+
+    Args:
+        G: A NetworkX graph object.
+        partition: Node -> community mapping used for node colors.
+        pos: Node -> (x, y) layout.
+
+    Returns:
+        A BytesIO object containing the image data.
+    """
+    import matplotlib.cm as cm
+    from matplotlib.colors import to_hex
+
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    nodes_df = pd.DataFrame({
+        'x': [pos[node][0] for node in nodes],
+        'y': [pos[node][1] for node in nodes],
+        'community': pd.Categorical([partition[node] for node in nodes]),
+    })
+    edges_df = pd.DataFrame({
+        'source': [index[u] for u, v in G.edges()],
+        'target': [index[v] for u, v in G.edges()],
+    })
+
+    canvas = ds.Canvas(plot_width=1600, plot_height=1200)
+    edge_img = tf.shade(canvas.line(connect_edges(nodes_df, edges_df), 'x', 'y'),
+                        cmap=['lightgray'])
+    color_key = {comm_id: to_hex(cm.tab20(comm_id % 20))
+                 for comm_id in set(partition.values())}
+    node_img = tf.spread(
+        tf.shade(canvas.points(nodes_df, 'x', 'y',
+                               agg=ds.count_cat('community')),
+                 color_key=color_key),
+        px=2)
+
+    # Composite edges under nodes on a white background
+    img = Image.new('RGBA', (1600, 1200), 'white')
+    img = Image.alpha_composite(img, edge_img.to_pil())
+    img = Image.alpha_composite(img, node_img.to_pil())
+
+    img_buf = io.BytesIO()
+    img.save(img_buf, 'PNG')
+    img_buf.seek(0)
+    return img_buf
+
+
+def generate_graph_image(G: nx.Graph,
+                         partition: Optional[Dict[Any, int]] = None,
+                         pos: Optional[Dict[Any, Any]] = None,
+                         labels: Optional[np.ndarray] = None,
+                         num_communities: Optional[int] = None) -> BytesIO:
     """
     Generates a visualization of the graph with community colors and labels.
 
     Args:
         G: A NetworkX graph object.
+        partition: Optional precomputed node -> community mapping. When
+            provided, the Louvain pass is skipped.
+        pos: Optional precomputed node -> (x, y) layout. When provided,
+            the layout pass is skipped.
+        labels: Optional dense int32 community labels in G.nodes() order,
+            as produced by partition_labels.
+        num_communities: Optional precomputed community count.
 
     Returns:
         A BytesIO object containing the image data.
     """
-    plt.figure(figsize=(16, 12))
-    pos = nx.spring_layout(G, k=0.5, iterations=50, seed=42)
+    if pos is None:
+        pos = compute_layout(G)
 
     # Detect communities for coloring
-    partition = community_louvain.best_partition(G)
-    
-    # Create a color map for communities
+    if partition is None:
+        partition = compute_partition(G)
+        labels = None
+
+    if DATASHADER_AVAILABLE and len(G.nodes) >= DATASHADER_NODE_THRESHOLD:
+        return _generate_graph_image_datashader(G, partition, pos)
+
+    fig = _acquire_figure()
+    ax = fig.add_subplot()
+
+    # Dense community labels in G.nodes() order, shared by the color
+    # mapping, the centroid pass, and the community count
     import matplotlib.cm as cm
-    import numpy as np
-    num_communities = len(set(partition.values()))
-    colors = [partition[node] for node in G.nodes()]
-    
-    # Draw edges first (in background)
-    nx.draw_networkx_edges(G, pos, alpha=0.1, width=0.5)
-    
-    # Draw nodes with community colors
-    nx.draw_networkx_nodes(G, pos, 
-                          node_size=100,
-                          node_color=colors,
-                          cmap=cm.tab20,
-                          alpha=0.8,
-                          edgecolors='black',
-                          linewidths=0.5)
-
-    # Calculate center positions for each community and add labels
-    community_centers = {}
-    for node, comm_id in partition.items():
-        if comm_id not in community_centers:
-            community_centers[comm_id] = {'x': [], 'y': []}
-        community_centers[comm_id]['x'].append(pos[node][0])
-        community_centers[comm_id]['y'].append(pos[node][1])
-    
+    if labels is None:
+        comm_ids, labels = np.unique([partition[node] for node in G.nodes()],
+                                     return_inverse=True)
+        labels = labels.astype(np.int32)
+    else:
+        comm_ids = np.arange(int(labels.max()) + 1 if len(labels) else 0)
+    if num_communities is None:
+        num_communities = len(comm_ids)
+
+    # Flatten the layout dict to one contiguous (N, 2) array up front;
+    # edge segments, the scatter, and the centroid pass all index it
+    node_index = {node: i for i, node in enumerate(G.nodes())}
+    pos_arr = np.empty((G.number_of_nodes(), 2), dtype=np.float32)
+    for node, xy in pos.items():
+        pos_arr[node_index[node]] = xy
+
+    # Draw all edges as one LineCollection rather than per-edge artists
+    edge_idx = np.fromiter(
+        (node_index[node] for edge in G.edges() for node in edge),
+        dtype=np.int32, count=2 * G.number_of_edges()).reshape(-1, 2)
+    if len(edge_idx):
+        ax.add_collection(LineCollection(pos_arr[edge_idx], colors='black',
+                                         linewidths=0.5, alpha=0.1))
+
+    # Draw nodes with community colors in a single scatter call; indexing
+    # a 20-entry RGBA table skips the per-node Normalize -> colormap pass
+    palette = cm.tab20(np.arange(20)).astype(np.float32)
+    rgba = np.ascontiguousarray(palette[labels % 20])
+    ax.scatter(pos_arr[:, 0], pos_arr[:, 1],
+               s=100,
+               c=rgba,
+               alpha=0.8,
+               edgecolors='black',
+               linewidths=0.5)
+
+    # Calculate center positions for each community via a segmented sum
+    centers = _community_centroids(pos_arr, labels, num_communities)
+
     # Draw community labels at the center of each cluster
-    for comm_id, coords in community_centers.items():
-        center_x = np.mean(coords['x'])
-        center_y = np.mean(coords['y'])
-        plt.text(center_x, center_y, f'C{comm_id}', 
+    for comm_id, (center_x, center_y) in zip(comm_ids, centers):
+        ax.text(center_x, center_y, f'C{comm_id}',
                 fontsize=14, fontweight='bold',
                 ha='center', va='center',
-                bbox=dict(boxstyle='round,pad=0.5', facecolor='white', 
-                         edgecolor='black', alpha=0.8))
+                bbox=dict(boxstyle='round,pad=0.5', facecolor='white',
+                          edgecolor='black', alpha=0.8))
+
+    ax.set_title(f"Bike Sharing Network - {num_communities} Communities Detected",
+                 fontsize=18, fontweight='bold', pad=20)
 
-    plt.title(f"Bike Sharing Network - {num_communities} Communities Detected", 
-              fontsize=18, fontweight='bold', pad=20)
-    
     # Add legend
-    plt.text(0.02, 0.98, f'Total Nodes: {len(G.nodes)}\nTotal Communities: {num_communities}',
-             transform=plt.gca().transAxes,
-             fontsize=11,
-             verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
-    
-    plt.axis('off')
-    plt.tight_layout()
+    ax.text(0.02, 0.98, f'Total Nodes: {len(G.nodes)}\nTotal Communities: {num_communities}',
+            transform=ax.transAxes,
+            fontsize=11,
+            verticalalignment='top',
+            bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+
+    ax.axis('off')
 
+    # 90 DPI on a 12x9 figure is plenty for a web response; skipping
+    # bbox_inches='tight' avoids a second full render pass
     img_buf = io.BytesIO()
-    plt.savefig(img_buf, format='png', dpi=150, bbox_inches='tight')
-    plt.close()
+    fig.savefig(img_buf, format='png', dpi=90)
+    _release_figure(fig)
     img_buf.seek(0)
 
     return img_buf
@@ -29,6 +29,31 @@ def test_analyze_endpoint_no_data():
     assert response.json()["detail"] == "Graph data not available"
 
 
+def test_visualize_endpoint_etag_roundtrip(mock_graph):
+    graph_state.clear()
+    graph_state["G"] = mock_graph
+
+    response = client.get("/visualize")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+    # Second hit serves the cached bytes
+    repeat = client.get("/visualize")
+    assert repeat.status_code == 200
+    assert repeat.content == response.content
+
+    # RFC 7232 revalidation: exact, weak, list, and * forms all 304
+    for header in (etag, f"W/{etag}", f'"stale", {etag}', "*"):
+        not_modified = client.get("/visualize", headers={"If-None-Match": header})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+
+    # A stale tag still gets the full representation
+    assert client.get("/visualize", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
 def test_analyze_endpoint_success(mock_graph):
     # Inject mock graph into state
     graph_state["G"] = mock_graph
@@ -0,0 +1,33 @@
+from app.processing import (
+    load_graph_data,
+    compute_partition,
+    modularity_fast,
+    generate_graph_image,
+    DATASHADER_AVAILABLE,
+    DATASHADER_NODE_THRESHOLD,
+)
+import community.community_louvain as community_louvain
+import networkx as nx
+import pytest
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def test_modularity_fast_matches_python_louvain():
+    G = load_graph_data("data/Databike.csv")
+    partition = compute_partition(G)
+    expected = community_louvain.modularity(partition, G)
+    result = modularity_fast(partition, G.graph["adj"], G.graph["node_ids"])
+    assert abs(result - expected) < 1e-9
+
+
+@pytest.mark.skipif(not DATASHADER_AVAILABLE, reason="datashader not installed")
+def test_generate_graph_image_datashader_path():
+    G = nx.gnm_random_graph(DATASHADER_NODE_THRESHOLD,
+                            3 * DATASHADER_NODE_THRESHOLD, seed=42)
+    assert generate_graph_image(G).getvalue().startswith(PNG_MAGIC)
+
+
+def test_generate_graph_image_matplotlib_path():
+    G = nx.karate_club_graph()
+    assert generate_graph_image(G).getvalue().startswith(PNG_MAGIC)